@@ -1,64 +1,106 @@
 import os
 import logging
+import hashlib
+import atexit
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ChatPermissions
-from telegram.ext import Updater, CommandHandler, CallbackQueryHandler, MessageHandler, Filters
+from telegram.ext import (
+    Application, AIORateLimiter, CommandHandler, CallbackQueryHandler, ChatMemberHandler, ContextTypes
+)
+from telegram.request import HTTPXRequest
 from telegram.error import BadRequest, NetworkError, TimedOut, RetryAfter
-import requests
-from blockcypher import get_transaction_details, get_address_details
+import httpx
+import redis.asyncio as aioredis
+import msgpack
+import orjson
+import zstandard as zstd
 from nowpayments import NOWPayments
-import json
-import traceback
 import time
+import asyncio
+import random
+import functools
+from collections import deque
+
+# Use uvloop's faster event loop where it is available (not on Windows). This runs at
+# import so module-level asyncio objects are bound to the loop the bot runs on.
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
 
 # Load environment variables
 load_dotenv()
 
-# Configure logging with more detailed format
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s - [%(filename)s:%(lineno)d]',
-    level=logging.INFO,
-    handlers=[
-        logging.FileHandler('bot.log'),
-        logging.StreamHandler()
-    ]
-)
+# Configure logging with more detailed format; records are written to the file and
+# console from a background thread so handlers never block on disk I/O
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s - [%(filename)s:%(lineno)d]'
+log_handlers = [
+    logging.FileHandler('bot.log'),
+    logging.StreamHandler()
+]
+for log_handler in log_handlers:
+    log_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers)
+queue_handler = QueueHandler(log_queue)
+queue_handler.setFormatter(logging.Formatter('%(message)s'))
+logging.basicConfig(level=logging.INFO, handlers=[queue_handler])
+log_listener.start()
+atexit.register(log_listener.stop)
+# httpx logs every request URL at INFO, and Bot API URLs embed the bot token
+logging.getLogger('httpx').setLevel(logging.WARNING)
+# Records never report thread or process details, so skip collecting them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 logger = logging.getLogger(__name__)
 
 # Initialize NOWPayments API
-nowpayments = NOWPayments(api_key=os.getenv('NOWPAYMENTS_API_KEY'))
-
-# Store active transactions
-active_transactions = {}
-
-# Load blocked users
-BLOCKED_USERS_FILE = 'blocked_users.json'
-blocked_users = set()
+NOWPAYMENTS_API_KEY = os.getenv('NOWPAYMENTS_API_KEY')
+nowpayments = NOWPayments(api_key=NOWPAYMENTS_API_KEY)
+
+# Shared HTTP client for BlockCypher/NOWPayments calls (one connection pool for all requests)
+BLOCKCYPHER_TX_URL = "https://api.blockcypher.com/v1/{coin}/main/txs/{tx_id}"
+BLOCKCYPHER_ADDR_URL = "https://api.blockcypher.com/v1/{coin}/main/addrs/{address}/balance"
+# Idle connections are kept for 75s so TLS sessions survive between 60s poll ticks
+http_client = httpx.AsyncClient(
+    http2=True,
+    timeout=10,
+    limits=httpx.Limits(max_connections=100, keepalive_expiry=75)
+)
+# Caps in-flight BlockCypher requests so a large poll waits here rather than timing out on the pool
+BLOCKCYPHER_MAX_CONCURRENCY = 50
+BLOCKCYPHER_BATCH_SIZE = 100  # Max tx hashes per batched /txs/a;b;c request
+blockcypher_semaphore = asyncio.Semaphore(BLOCKCYPHER_MAX_CONCURRENCY)
+
+# Initialize Redis client (connection pool is shared by all handlers)
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+redis_client = aioredis.from_url(REDIS_URL)
+
+# Transactions are Redis hashes keyed by chat; nested party dicts are msgpack-encoded.
+# Monitored tx ids are a per-chat hash of tx_id -> last reported status.
+TX_KEY_PREFIX = 'tx:'
+MONITOR_KEY_PREFIX = 'monitor:'
+PACKED_TX_FIELDS = ('buyer', 'seller')
+TX_EXPIRY_KEY = 'tx_expiry'  # Sorted set of chat ids scored by transaction expiry (unix time)
+
+# Blocked users are kept in a Redis set
+BLOCKED_USERS_KEY = 'blocked_users'
+
+# Address validation results are cached in Redis for an hour
+ADDRESS_CACHE_PREFIX = 'addr:'
+ADDRESS_CACHE_TTL = 3600
+# Addresses are validated offline by checksum; set to also require BlockCypher to know them
+VERIFY_ADDRESSES_ONLINE = os.getenv('VERIFY_ADDRESSES_ONLINE', '').lower() in ('1', 'true', 'yes')
 
 # Cleanup settings
 CLEANUP_INTERVAL = 3600  # Clean up every hour
 TRANSACTION_TIMEOUT = 86400  # 24 hours timeout for transactions
-
-def load_blocked_users():
-    try:
-        with open(BLOCKED_USERS_FILE, 'r') as f:
-            return set(json.load(f))
-    except FileNotFoundError:
-        return set()
-    except json.JSONDecodeError as e:
-        logger.error(f"Error loading blocked users: {e}")
-        return set()
-
-def save_blocked_users():
-    try:
-        with open(BLOCKED_USERS_FILE, 'w') as f:
-            json.dump(list(blocked_users), f)
-    except Exception as e:
-        logger.error(f"Error saving blocked users: {e}")
-
-# Load blocked users on startup
-blocked_users = load_blocked_users()
+CLEANUP_BATCH_SIZE = 1000  # Expired transactions removed per Redis round-trip
 
 # Constants
 OWNER_CHANNEL = "https://t.me/redirectosakura"
@@ -66,8 +108,13 @@ ADMIN_CHANNEL = "https://t.me/redirectosakura"  # Using owner channel for now
 VOUCH_CHANNEL = "https://t.me/redirectosakura"  # Using owner channel for now
 ESCROW_FEE_PERCENTAGE = float(os.getenv('ESCROW_FEE_PERCENTAGE', 5))
 BOT_OWNER_ID = int(os.getenv('BOT_OWNER_ID', 0))
-ADMIN_IDS = [int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if id.strip()]
+ADMIN_IDS = frozenset(int(id.strip()) for id in os.getenv('ADMIN_IDS', '').split(',') if id.strip())
 ADMIN_GROUP_ID = int(os.getenv('ADMIN_GROUP_ID', 0))
+BOT_PERMISSIONS_TTL = 300  # Re-check the bot's group permissions every 5 minutes
+# Only the update types the handlers consume; Telegram filters out the rest server-side
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.MY_CHAT_MEMBER]
+# Discard updates queued at Telegram while the bot was down instead of replaying them on startup
+DROP_PENDING_UPDATES = os.getenv('DROP_PENDING_UPDATES', '').lower() in ('1', 'true', 'yes')
 
 def is_admin(user_id: int) -> bool:
     """Check if user is an admin"""
@@ -77,179 +124,606 @@ def is_owner(user_id: int) -> bool:
     """Check if user is the bot owner"""
     return user_id == BOT_OWNER_ID
 
-def is_blocked(user_id: int) -> bool:
+async def is_blocked(user_id: int) -> bool:
     """Check if user is blocked"""
-    return user_id in blocked_users
+    return bool(await redis_client.sismember(BLOCKED_USERS_KEY, user_id))
 
 async def check_bot_permissions(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Check if bot has required permissions in the group"""
+    cache_key = ('perm', update.effective_chat.id)
+    cached = context.bot_data.get(cache_key)
+    if cached and cached[1] > time.monotonic():
+        return cached[0]
+
     try:
         bot_member = await update.effective_chat.get_member(context.bot.id)
-        return bot_member.can_restrict_members and bot_member.can_delete_messages
+        has_permissions = bot_member.can_restrict_members and bot_member.can_delete_messages
+        context.bot_data[cache_key] = (has_permissions, time.monotonic() + BOT_PERMISSIONS_TTL)
+        return has_permissions
     except BadRequest as e:
-        logger.error(f"Error checking bot permissions: {e}")
+        logger.error("Error checking bot permissions: %s", e)
         return False
     except Exception as e:
-        logger.error(f"Unexpected error checking bot permissions: {e}")
+        logger.error("Unexpected error checking bot permissions: %s", e)
         return False
 
+async def handle_bot_member_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Drop the cached permissions when the bot's membership in a chat changes"""
+    context.bot_data.pop(('perm', update.effective_chat.id), None)
+
+CHAT_TYPE_ERRORS = {
+    'private': "This command is only available in private chat!",
+    'group': "This command only works in group chats!",
+}
+
+def require(chat_type: str = None, not_blocked: bool = False, check_perms: bool = False):
+    """Decorate a handler with the shared chat type, blocked user and bot permission checks"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+            message = update.effective_message
+            if not_blocked and await is_blocked(update.effective_user.id):
+                await message.reply_text("You are blocked from using this bot.")
+                return
+            if chat_type and update.effective_chat.type != chat_type:
+                await message.reply_text(CHAT_TYPE_ERRORS[chat_type])
+                return
+            if check_perms and not await check_bot_permissions(update, context):
+                await message.reply_text("Bot needs admin privileges to function!")
+                return
+            return await handler(update, context)
+        return wrapper
+    return decorator
+
+# Coin by leading character of base58 addresses, and by human-readable part of bech32 ones
+BASE58_ADDRESS_COINS = {'1': 'btc', '3': 'btc', 'L': 'ltc', 'M': 'ltc'}
+BECH32_ADDRESS_COINS = {'bc': 'btc', 'ltc': 'ltc'}
+
 def detect_crypto_type(address: str) -> str:
     """Detect if address is BTC or LTC"""
-    if address.startswith('1') or address.startswith('3') or address.startswith('bc1'):
-        return 'btc'
-    elif address.startswith('L') or address.startswith('M') or address.startswith('ltc1'):
-        return 'ltc'
-    else:
+    coin = BASE58_ADDRESS_COINS.get(address[:1])
+    if coin is None:
+        # The bech32 data charset has no '1', so the first '1' ends the human-readable part
+        hrp, separator, _ = address.partition('1')
+        coin = BECH32_ADDRESS_COINS.get(hrp) if separator else None
+    if coin is None:
         raise ValueError("Invalid cryptocurrency address")
+    return coin
+
+# Offline address checksums: base58check (legacy/P2SH) and bech32/bech32m (BIP-173/BIP-350)
+BASE58_ALPHABET = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+BASE58_DIGITS = {char: value for value, char in enumerate(BASE58_ALPHABET)}
+BECH32_CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+BECH32_DIGITS = {char: value for value, char in enumerate(BECH32_CHARSET)}
+BECH32_GENERATOR = (0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3)
+BECH32_CONST = 1
+BECH32M_CONST = 0x2bc830a3
+
+def is_valid_base58check(address: str) -> bool:
+    """Verify the double-SHA256 checksum of a base58check address"""
+    num = 0
+    for char in address:
+        digit = BASE58_DIGITS.get(char)
+        if digit is None:
+            return False
+        num = num * 58 + digit
+    leading_zeros = len(address) - len(address.lstrip('1'))
+    raw = b'\x00' * leading_zeros + num.to_bytes((num.bit_length() + 7) // 8, 'big')
+    if len(raw) != 25:
+        return False
+    payload, checksum = raw[:-4], raw[-4:]
+    return hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] == checksum
+
+def bech32_polymod(values) -> int:
+    """BCH checksum over 5-bit values as defined in BIP-173"""
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1ffffff) << 5 ^ value
+        for i, generator in enumerate(BECH32_GENERATOR):
+            if (top >> i) & 1:
+                chk ^= generator
+    return chk
+
+def is_valid_bech32(address: str) -> bool:
+    """Verify the checksum of a bech32 (witness v0) or bech32m (v1+) address"""
+    if address.lower() != address and address.upper() != address:
+        return False
+    address = address.lower()
+    hrp, _, data_part = address.rpartition('1')
+    if not hrp or len(data_part) < 7 or len(address) > 90:
+        return False
+    data = [BECH32_DIGITS.get(char) for char in data_part]
+    if None in data:
+        return False
+    expanded_hrp = [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+    expected = BECH32_CONST if data[0] == 0 else BECH32M_CONST
+    return bech32_polymod(expanded_hrp + data) == expected
+
+def has_valid_checksum(address: str) -> bool:
+    """Check an address's checksum without any network access"""
+    if address[:1] in BASE58_ADDRESS_COINS:
+        return is_valid_base58check(address)
+    return is_valid_bech32(address)
 
 # Add new transaction monitoring variables
 MONITORING_INTERVAL = 60  # Check every 60 seconds
-monitored_transactions = {}
-
-def cleanup_old_transactions(context):
+TX_INFO_CACHE_PREFIX = 'txinfo:'
+TX_COIN_PREFIX = 'tx_coin:'
+TX_COIN_TTL = 86400  # Remember which chain a tx is on for a day
+TX_INFO_CACHE_TTL = 30  # Reuse a tx lookup for 30 seconds
+# Cached tx payloads (full BlockCypher responses) are stored as zstd-compressed msgpack
+zstd_compressor = zstd.ZstdCompressor(level=3)
+zstd_decompressor = zstd.ZstdDecompressor()
+POLL_BACKOFF_CAP = 300  # Longest wait between retries of a failing tx
+POLL_FAILURE_DEADLINE = 3600  # Stop monitoring a tx that has failed for an hour
+poll_backoff = {}  # tx_id -> {'since', 'delay', 'retry_at'} while polls fail
+
+def tx_key(chat_id) -> str:
+    """Redis key of the transaction hash for a chat"""
+    return f"{TX_KEY_PREFIX}{chat_id}"
+
+def monitor_key(chat_id) -> str:
+    """Redis key of the hash of monitored tx ids (-> last status) for a chat"""
+    return f"{MONITOR_KEY_PREFIX}{chat_id}"
+
+def decode_tx(raw: dict) -> dict:
+    """Decode a raw Redis transaction hash into a dict"""
+    transaction = {}
+    for field, value in raw.items():
+        field = field.decode()
+        if field in PACKED_TX_FIELDS:
+            transaction[field] = msgpack.unpackb(value)
+        else:
+            transaction[field] = value.decode()
+    return transaction
+
+async def get_tx(chat_id) -> dict:
+    """Load the active transaction of a chat (empty dict if none)"""
+    return decode_tx(await redis_client.hgetall(tx_key(chat_id)))
+
+async def get_tx_coin(chat_id):
+    """Coin of the addresses set up for a chat's transaction (None if no party is set yet)"""
+    for packed in await redis_client.hmget(tx_key(chat_id), PACKED_TX_FIELDS):
+        if packed:
+            return msgpack.unpackb(packed)['coin_type']
+    return None
+
+async def set_tx_party(chat_id, role: str, party: dict):
+    """Store the buyer or seller of a chat's transaction"""
+    expires_at = time.time() + TRANSACTION_TIMEOUT
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(tx_key(chat_id), role, msgpack.packb(party))
+        pipe.hsetnx(tx_key(chat_id), 'expires_at', expires_at)
+        pipe.zadd(TX_EXPIRY_KEY, {chat_id: expires_at}, nx=True)
+        await pipe.execute()
+
+# Atomically returns {claimed, HGETALL} for a transaction and deletes it only when the
+# payment is confirmed and ARGV[1] is its buyer or seller, so a payout happens at most once
+CLAIM_RELEASE_SCRIPT = """
+local tx = redis.call('HGETALL', KEYS[1])
+local fields = {}
+for i = 1, #tx, 2 do fields[tx[i]] = tx[i + 1] end
+if fields['payment_status'] ~= 'confirmed' or not fields['buyer'] or not fields['seller'] then
+    return {0, tx}
+end
+local user_id = tonumber(ARGV[1])
+if cmsgpack.unpack(fields['buyer'])['user_id'] ~= user_id
+        and cmsgpack.unpack(fields['seller'])['user_id'] ~= user_id then
+    return {0, tx}
+end
+redis.call('DEL', KEYS[1])
+return {1, tx}
+"""
+claim_release_tx = redis_client.register_script(CLAIM_RELEASE_SCRIPT)
+
+async def count_active_transactions() -> int:
+    """Count active transaction hashes"""
+    count = 0
+    async for _ in redis_client.scan_iter(match=f"{TX_KEY_PREFIX}*"):
+        count += 1
+    return count
+
+async def cleanup_old_transactions(context):
     """Clean up old transactions"""
     try:
-        current_time = datetime.now()
+        current_time = time.time()
         expired_chats = []
 
-        for chat_id, transaction in active_transactions.items():
-            # Check if transaction is too old
-            if 'timestamp' in transaction:
-                transaction_time = datetime.fromisoformat(transaction['timestamp'])
-                if (current_time - transaction_time).total_seconds() > TRANSACTION_TIMEOUT:
-                    expired_chats.append(chat_id)
-                    logger.info(f"Cleaning up expired transaction in chat {chat_id}")
-
-        # Remove expired transactions
-        for chat_id in expired_chats:
-            del active_transactions[chat_id]
-            try:
+        # Only entries that are already due are read from the expiry index, a bounded batch at a time
+        while True:
+            members = await redis_client.zrangebyscore(
+                TX_EXPIRY_KEY, '-inf', current_time, start=0, num=CLEANUP_BATCH_SIZE
+            )
+            if not members:
+                break
+
+            # Unindex the batch and read each chat's expiry in one round-trip
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.zrem(TX_EXPIRY_KEY, *members)
+                for member in members:
+                    pipe.hget(tx_key(int(member)), 'expires_at')
+                expirations = (await pipe.execute())[1:]
+
+            batch_expired = []
+            reindex = {}
+            for member, expires_at in zip(members, expirations):
+                chat_id = int(member)
+                if expires_at is None:
+                    continue  # Already released or refunded
+                if float(expires_at) > current_time:
+                    # The chat has started a newer transaction; index its own expiry instead
+                    reindex[chat_id] = float(expires_at)
+                    continue
+                batch_expired.append(chat_id)
+                logger.info("Cleaning up expired transaction in chat %s", chat_id)
+            if reindex:
+                await redis_client.zadd(TX_EXPIRY_KEY, reindex)
+
+            # Remove the batch's expired transactions in one call
+            if batch_expired:
+                await redis_client.delete(
+                    *(key for chat_id in batch_expired for key in (tx_key(chat_id), monitor_key(chat_id)))
+                )
+            expired_chats.extend(batch_expired)
+
+            if len(members) < CLEANUP_BATCH_SIZE:
+                break
+
+        # Notify all chats at once; the Application's AIORateLimiter paces the sends
+        results = await asyncio.gather(
+            *(
                 context.bot.send_message(
                     chat_id=chat_id,
                     text="⚠️ Transaction has expired due to inactivity. Please start a new transaction if needed."
                 )
-            except Exception as e:
-                logger.error(f"Error sending cleanup message to chat {chat_id}: {e}")
+                for chat_id in expired_chats
+            ),
+            return_exceptions=True
+        )
+        for chat_id, result in zip(expired_chats, results):
+            if isinstance(result, Exception):
+                logger.error("Error sending cleanup message to chat %s: %s", chat_id, result)
 
-        logger.info(f"Cleanup completed. Removed {len(expired_chats)} expired transactions.")
+        logger.info("Cleanup completed. Removed %s expired transactions.", len(expired_chats))
     except Exception as e:
-        logger.error(f"Error during cleanup: {e}")
+        logger.error("Error during cleanup: %s", e)
+
+ADMIN_NOTIFY_INTERVAL = 3  # Seconds between flushes of queued admin notifications
+ADMIN_MESSAGE_LIMIT = 4000  # Stay under Telegram's 4096 character message limit
+admin_outbox = deque()
+
+def notify_admins(text: str):
+    """Queue a plain-text notification for the admin group; flush_admin_notifications sends it"""
+    admin_outbox.append(text.strip())
+
+async def flush_admin_notifications(context: ContextTypes.DEFAULT_TYPE):
+    """Send queued admin notifications (JobQueue callback)"""
+    await send_admin_notifications(context.bot)
+
+async def flush_admin_outbox(application: Application):
+    """Send admin notifications still queued when the bot stops (post_stop hook)"""
+    await send_admin_notifications(application.bot)
+
+async def send_admin_notifications(bot):
+    """Send queued admin notifications, joined into as few messages as fit"""
+    batches = []
+    while admin_outbox:
+        text = admin_outbox.popleft()[:ADMIN_MESSAGE_LIMIT]
+        if batches and len(batches[-1]) + len(text) + 2 <= ADMIN_MESSAGE_LIMIT:
+            batches[-1] += "\n\n" + text
+        else:
+            batches.append(text)
 
-def handle_api_error(e, update, context, operation):
-    """Handle API errors and notify appropriate parties"""
-    error_message = f"Error during {operation}: {str(e)}"
-    logger.error(error_message)
-    logger.error(traceback.format_exc())
+    for batch in batches:
+        try:
+            await bot.send_message(
+                chat_id=ADMIN_GROUP_ID,
+                text=batch,
+                disable_web_page_preview=True
+            )
+        except Exception as e:
+            logger.error("Error sending admin notification: %s", e)
 
-    # Notify admins
-    admin_message = f"""
+API_ERROR_ALERT = """
 🚨 API Error Alert
 Operation: {operation}
-Error: {str(e)}
-Chat ID: {update.effective_chat.id if update.effective_chat else 'N/A'}
-User: {update.effective_user.id if update.effective_user else 'N/A'}
-    """
-    
-    try:
-        context.bot.send_message(
-            chat_id=ADMIN_GROUP_ID,
-            text=admin_message
-        )
-    except Exception as admin_error:
-        logger.error(f"Error sending admin notification: {admin_error}")
+Error: {error}
+Chat ID: {chat_id}
+User: {user_id}
+"""
+
+async def handle_api_error(e, update, context, operation):
+    """Handle API errors and notify appropriate parties"""
+    # The traceback is only formatted if a handler actually emits the record
+    logger.error("Error during %s: %s", operation, e, exc_info=e)
+
+    # Notify admins
+    notify_admins(API_ERROR_ALERT.format(
+        operation=operation,
+        error=e,
+        chat_id=update.effective_chat.id if update.effective_chat else 'N/A',
+        user_id=update.effective_user.id if update.effective_user else 'N/A'
+    ))
 
     # Notify user if possible
     if update.effective_chat:
         try:
-            update.message.reply_text(
+            await update.message.reply_text(
                 f"Sorry, there was an error during {operation}. "
                 "The admin has been notified and will look into it."
             )
         except Exception as user_error:
-            logger.error(f"Error sending user notification: {user_error}")
-
-def monitor_transaction(chat_id, tx_id, context):
-    """Monitor a transaction and send updates"""
-    last_status = None
-    retry_count = 0
-    max_retries = 3
+            logger.error("Error sending user notification: %s", user_error)
+
+async def fetch_coin_tx(coin, tx_id):
+    """Fetch transaction details for a single coin from BlockCypher"""
+    async with blockcypher_semaphore:
+        response = await http_client.get(BLOCKCYPHER_TX_URL.format(coin=coin, tx_id=tx_id))
+    response.raise_for_status()
+    return orjson.loads(response.content), coin
+
+async def fetch_tx(tx_id, coin_hint=None):
+    """Fetch transaction details from BlockCypher, probing BTC and LTC concurrently unless the coin is known"""
+    # Once a tx has been found, or its escrow's coin is known, only that coin is queried
+    coin_key = f"{TX_COIN_PREFIX}{tx_id}"
+    known_coin = await redis_client.get(coin_key)
+    if known_coin:
+        coins = (known_coin.decode(),)
+    elif coin_hint:
+        coins = (coin_hint,)
+    else:
+        coins = ('btc', 'ltc')
 
-    while True:
-        try:
-            # Try BTC first
+    # Take the first probe that succeeds and cancel the other
+    tasks = [asyncio.create_task(fetch_coin_tx(coin, tx_id)) for coin in coins]
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
             try:
-                tx_info = get_transaction_details(tx_id, coin_symbol='btc')
-                coin_type = 'BTC'
-            except Exception as e:
-                # If not BTC, try LTC
-                try:
-                    tx_info = get_transaction_details(tx_id, coin_symbol='ltc')
-                    coin_type = 'LTC'
-                except Exception as ltc_error:
-                    raise Exception(f"Failed to get transaction details: {str(e)} | {str(ltc_error)}")
-            
-            if tx_info:
-                current_status = "Confirmed" if tx_info.get('confirmations', 0) > 0 else "Pending"
-                amount = tx_info.get('total', 0) / 100000000
-                confirmations = tx_info.get('confirmations', 0)
-                
-                if current_status != last_status:
-                    message = f"""
+                tx_info, coin = await next_done
+            except httpx.HTTPError as e:
+                errors.append(str(e))
+                continue
+            if not known_coin:
+                await redis_client.setex(coin_key, TX_COIN_TTL, coin)
+            return tx_info, coin.upper()
+    finally:
+        for task in tasks:
+            task.cancel()
+    raise Exception(f"Failed to get transaction details: {' | '.join(errors)}")
+
+async def fetch_tx_batch(coin, tx_ids):
+    """Fetch several transactions of one coin in a single BlockCypher call"""
+    async with blockcypher_semaphore:
+        response = await http_client.get(BLOCKCYPHER_TX_URL.format(coin=coin, tx_id=';'.join(tx_ids)))
+    response.raise_for_status()
+    result = orjson.loads(response.content)
+    # A batch of one comes back as a bare object; failed entries carry 'error' instead of 'hash'
+    if isinstance(result, dict):
+        result = [result]
+    return {tx['hash']: tx for tx in result if 'hash' in tx}
+
+async def fetch_many_tx(tx_ids):
+    """Fetch transactions, batched per known coin; returns tx_id -> (tx_info, coin_type) or Exception"""
+    tx_ids = list(tx_ids)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.mget([f"{TX_INFO_CACHE_PREFIX}{tx_id}" for tx_id in tx_ids])
+        pipe.mget([f"{TX_COIN_PREFIX}{tx_id}" for tx_id in tx_ids])
+        cached_infos, coins = await pipe.execute()
+
+    # Lookups made in the last few seconds (e.g. by /transaction) are reused as they are
+    results = {}
+    batches = []
+    unknown = []
+    by_coin = {}
+    for tx_id, cached, coin in zip(tx_ids, cached_infos, coins):
+        if cached is not None:
+            results[tx_id] = unpack_tx_info(cached)
+        elif coin:
+            by_coin.setdefault(coin.decode(), []).append(tx_id)
+        else:
+            unknown.append(tx_id)
+    for coin, coin_tx_ids in by_coin.items():
+        for i in range(0, len(coin_tx_ids), BLOCKCYPHER_BATCH_SIZE):
+            batches.append((coin, coin_tx_ids[i:i + BLOCKCYPHER_BATCH_SIZE]))
+
+    # Transactions whose coin isn't known yet still need the BTC/LTC probe
+    batch_results, probe_results = await asyncio.gather(
+        asyncio.gather(*(fetch_tx_batch(coin, ids) for coin, ids in batches), return_exceptions=True),
+        asyncio.gather(*(get_tx_info(tx_id) for tx_id in unknown), return_exceptions=True)
+    )
+
+    results.update(zip(unknown, probe_results))
+    fetched = {}
+    for (coin, batch_tx_ids), batch in zip(batches, batch_results):
+        for tx_id in batch_tx_ids:
+            if isinstance(batch, Exception):
+                results[tx_id] = batch
+            elif tx_id.lower() in batch:
+                results[tx_id] = fetched[tx_id] = (batch[tx_id.lower()], coin.upper())
+            else:
+                results[tx_id] = Exception(f"Transaction {tx_id} missing from {coin.upper()} batch response")
+
+    # Cache batched lookups like get_tx_info does for single ones
+    if fetched:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for tx_id, (tx_info, coin_type) in fetched.items():
+                pipe.setex(f"{TX_INFO_CACHE_PREFIX}{tx_id}", TX_INFO_CACHE_TTL, pack_tx_info(tx_info, coin_type))
+            await pipe.execute()
+    return results
+
+async def fetch_address(address, coin_type):
+    """Fetch address details from BlockCypher (None if the address is unknown/invalid)"""
+    async with blockcypher_semaphore:
+        response = await http_client.get(BLOCKCYPHER_ADDR_URL.format(coin=coin_type, address=address))
+    if response.status_code in (400, 404):
+        return None
+    response.raise_for_status()
+    return orjson.loads(response.content)
+
+async def is_valid_address(address, coin_type) -> bool:
+    """Check an address's checksum and, if enabled, look it up on BlockCypher (cached in Redis)"""
+    if not has_valid_checksum(address):
+        return False
+    if not VERIFY_ADDRESSES_ONLINE:
+        return True
+
+    key = f"{ADDRESS_CACHE_PREFIX}{coin_type}:{address}"
+    cached = await redis_client.get(key)
+    if cached is not None:
+        return cached == b'1'
+
+    valid = bool(await fetch_address(address, coin_type))
+    await redis_client.setex(key, ADDRESS_CACHE_TTL, b'1' if valid else b'0')
+    return valid
+
+def pack_tx_info(tx_info, coin_type) -> bytes:
+    """Serialize a tx lookup for the txinfo cache"""
+    return zstd_compressor.compress(msgpack.packb((tx_info, coin_type)))
+
+def unpack_tx_info(packed: bytes):
+    """Deserialize a txinfo cache entry into (tx_info, coin_type)"""
+    tx_info, coin_type = msgpack.unpackb(zstd_decompressor.decompress(packed))
+    return tx_info, coin_type
+
+async def get_tx_info(tx_id, coin_hint=None):
+    """Fetch transaction details, reusing a lookup made in the last few seconds"""
+    key = f"{TX_INFO_CACHE_PREFIX}{tx_id}"
+    cached = await redis_client.get(key)
+    if cached is not None:
+        return unpack_tx_info(cached)
+
+    tx_info, coin_type = await fetch_tx(tx_id, coin_hint)
+    await redis_client.setex(key, TX_INFO_CACHE_TTL, pack_tx_info(tx_info, coin_type))
+    return tx_info, coin_type
+
+async def confirm_payment(chat_id, tx_id, context):
+    """Stop monitoring a confirmed tx and mark the chat's payment as confirmed"""
+    await redis_client.hdel(monitor_key(chat_id), tx_id)
+    if await redis_client.exists(tx_key(chat_id)):
+        await redis_client.hset(tx_key(chat_id), 'payment_status', 'confirmed')
+        message = "✅ Payment confirmed! You can now use /release to release the funds."
+        await context.bot.send_message(chat_id=chat_id, text=message)
+
+async def process_tx_update(chat_id, tx_id, tx_info, coin_type, last_status, context):
+    """Send a status update for a monitored transaction if its status changed"""
+    current_status = "Confirmed" if tx_info.get('confirmations', 0) > 0 else "Pending"
+    if current_status == last_status:
+        return
+
+    amount = tx_info.get('total', 0) / 100000000
+    confirmations = tx_info.get('confirmations', 0)
+    message = f"""
 🔄 Transaction Update
 Status: {current_status}
 Amount: {amount} {coin_type}
 Confirmations: {confirmations}
-                    """
-                    context.bot.send_message(chat_id=chat_id, text=message)
-                    
-                    if current_status == "Confirmed" and chat_id in active_transactions:
-                        active_transactions[chat_id]['payment_status'] = 'confirmed'
-                        message = "✅ Payment confirmed! You can now use /release to release the funds."
-                        context.bot.send_message(chat_id=chat_id, text=message)
-                        break
-                
-                last_status = current_status
-                retry_count = 0  # Reset retry count on successful operation
-            
-            time.sleep(MONITORING_INTERVAL)
-            
-        except Exception as e:
-            retry_count += 1
-            if retry_count >= max_retries:
-                handle_api_error(e, Update(update_id=0), context, "transaction monitoring")
-                break
-            time.sleep(MONITORING_INTERVAL * retry_count)  # Exponential backoff
+    """
+    await context.bot.send_message(chat_id=chat_id, text=message)
 
-def start_monitoring(chat_id, tx_id, context):
-    """Start monitoring a transaction"""
-    if chat_id not in monitored_transactions:
-        monitored_transactions[chat_id] = set()
-    
-    if tx_id not in monitored_transactions[chat_id]:
-        monitored_transactions[chat_id].add(tx_id)
-        import threading
-        thread = threading.Thread(target=monitor_transaction, args=(chat_id, tx_id, context))
-        thread.daemon = True
-        thread.start()
+    if current_status == "Confirmed":
+        await confirm_payment(chat_id, tx_id, context)
+    else:
+        await redis_client.hset(monitor_key(chat_id), tx_id, current_status)
 
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle the /start command"""
-    if is_blocked(update.effective_user.id):
-        await update.message.reply_text("You are blocked from using this bot.")
+async def poll_all_tx(context: ContextTypes.DEFAULT_TYPE):
+    """Poll every monitored transaction once and send updates (JobQueue callback)"""
+    keys = [key async for key in redis_client.scan_iter(match=f"{MONITOR_KEY_PREFIX}*")]
+    if not keys:
+        poll_backoff.clear()
+        return
+
+    # Read every chat's monitor hash in a single round-trip
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.hgetall(key)
+        monitor_hashes = await pipe.execute()
+
+    # Chats watching the same tx share one fetch: tx_id -> [(chat_id, last_status)]
+    subscribers = {}
+    for key, monitor_hash in zip(keys, monitor_hashes):
+        chat_id = int(key.decode()[len(MONITOR_KEY_PREFIX):])
+        for tx_id, last_status in monitor_hash.items():
+            subscribers.setdefault(tx_id.decode(), []).append((chat_id, last_status.decode()))
+
+    # Forget backoff state of txs no longer monitored (expired, refunded or confirmed meanwhile)
+    for tx_id in poll_backoff.keys() - subscribers.keys():
+        del poll_backoff[tx_id]
+
+    # Skip transactions that are still backing off after failed polls
+    now = time.monotonic()
+    due = [tx_id for tx_id in subscribers if tx_id not in poll_backoff or poll_backoff[tx_id]['retry_at'] <= now]
+    if not due:
         return
 
+    results = await fetch_many_tx(due)
+
+    for tx_id in due:
+        result = results[tx_id]
+        chats = subscribers[tx_id]
+        if not isinstance(result, Exception):
+            poll_backoff.pop(tx_id, None)
+            tx_info, coin_type = result
+            updates = await asyncio.gather(
+                *(process_tx_update(chat_id, tx_id, tx_info, coin_type, last_status, context)
+                  for chat_id, last_status in chats),
+                return_exceptions=True
+            )
+            for (chat_id, _), outcome in zip(chats, updates):
+                if isinstance(outcome, Exception):
+                    logger.error("Error sending update for %s to chat %s: %s", tx_id, chat_id, outcome)
+            continue
+
+        backoff = poll_backoff.get(tx_id)
+        if backoff is None:
+            backoff = poll_backoff[tx_id] = {'since': now, 'delay': MONITORING_INTERVAL}
+        elif now - backoff['since'] >= POLL_FAILURE_DEADLINE:
+            del poll_backoff[tx_id]
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for chat_id, _ in chats:
+                    pipe.hdel(monitor_key(chat_id), tx_id)
+                await pipe.execute()
+            await handle_api_error(result, Update(update_id=0), context, "transaction monitoring")
+            continue
+        # Decorrelated jitter keeps failing monitors from retrying in lockstep
+        backoff['delay'] = min(POLL_BACKOFF_CAP, random.uniform(MONITORING_INTERVAL, backoff['delay'] * 3))
+        backoff['retry_at'] = now + backoff['delay']
+
+# Static replies, built once at import
+START_TEXT = (
+    "Welcome to the Escrow Bot! Please use this bot in a group chat for transactions.\n"
+    "Use /help to see available commands."
+)
+START_KEYBOARD = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Help", callback_data='help')],
+    [InlineKeyboardButton("Links", callback_data='links')],
+    [InlineKeyboardButton("Vouches", callback_data='vouches')]
+])
+HELP_TEXT = """
+Available Commands:
+/start - Start the bot
+/help - Show this help message
+/links - View owner and admin links
+/vouches - View vouch channel
+
+Group Commands:
+/buyer <address> - Set buyer role with crypto address
+/seller <address> - Set seller role with crypto address
+/transaction <id> - Check transaction status
+/release - Release funds to the other party
+"""
+LINKS_TEXT = f"""
+Owner Channel: {OWNER_CHANNEL}
+Admin Channel: {ADMIN_CHANNEL}
+"""
+VOUCHES_TEXT = f"View our vouch channel: {VOUCH_CHANNEL}"
+
+@require(not_blocked=True)
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle the /start command"""
     if update.effective_chat.type == 'private':
-        keyboard = [
-            [InlineKeyboardButton("Help", callback_data='help')],
-            [InlineKeyboardButton("Links", callback_data='links')],
-            [InlineKeyboardButton("Vouches", callback_data='vouches')]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text(
-            "Welcome to the Escrow Bot! Please use this bot in a group chat for transactions.\n"
-            "Use /help to see available commands.",
-            reply_markup=reply_markup
-        )
+        await update.message.reply_text(START_TEXT, reply_markup=START_KEYBOARD)
     else:
         # Check bot permissions
         if not await check_bot_permissions(update, context):
@@ -262,43 +736,20 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
         await update.message.reply_text("Bot is ready to handle escrow transactions!")
 
+@require(chat_type='private')
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /help command"""
-    if update.effective_chat.type == 'private':
-        help_text = """
-Available Commands:
-/start - Start the bot
-/help - Show this help message
-/links - View owner and admin links
-/vouches - View vouch channel
-
-Group Commands:
-/buyer <address> - Set buyer role with crypto address
-/seller <address> - Set seller role with crypto address
-/transaction <id> - Check transaction status
-/release - Release funds to the other party
-        """
-        await update.message.reply_text(help_text)
-    else:
-        await update.message.reply_text("This command is only available in private chat!")
+    await update.effective_message.reply_text(HELP_TEXT)
 
+@require(chat_type='private')
 async def links(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /links command"""
-    if update.effective_chat.type == 'private':
-        links_text = f"""
-Owner Channel: {OWNER_CHANNEL}
-Admin Channel: {ADMIN_CHANNEL}
-        """
-        await update.message.reply_text(links_text)
-    else:
-        await update.message.reply_text("This command is only available in private chat!")
+    await update.effective_message.reply_text(LINKS_TEXT)
 
+@require(chat_type='private')
 async def vouches(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /vouches command"""
-    if update.effective_chat.type == 'private':
-        await update.message.reply_text(f"View our vouch channel: {VOUCH_CHANNEL}")
-    else:
-        await update.message.reply_text("This command is only available in private chat!")
+    await update.effective_message.reply_text(VOUCHES_TEXT)
 
 async def create_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Create a payment using NOWPayments API"""
@@ -313,7 +764,7 @@ async def create_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
         # Headers
         headers = {
-            "x-api-key": os.getenv('NOWPAYMENTS_API_KEY'),
+            "x-api-key": NOWPAYMENTS_API_KEY,
             "Content-Type": "application/json"
         }
         
@@ -329,12 +780,19 @@ async def create_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
         }
         
         # Make the API request
-        response = requests.post(url, headers=headers, json=data)
+        response = await http_client.post(url, headers=headers, json=data)
         response.raise_for_status()  # Raise an exception for bad status codes
         
-        result = response.json()
+        result = orjson.loads(response.content)
         
         if 'payment_url' in result:
+            # Attach the payment to this chat's escrow transaction
+            if result.get('payment_id'):
+                await redis_client.hset(tx_key(update.effective_chat.id), mapping={
+                    'payment_id': result['payment_id'],
+                    'amount': amount
+                })
+
             keyboard = [
                 [InlineKeyboardButton("Pay Now", url=result['payment_url'])]
             ]
@@ -350,11 +808,11 @@ async def create_payment(update: Update, context: ContextTypes.DEFAULT_TYPE):
         else:
             await update.message.reply_text("❌ Failed to create payment. Please try again.")
             
-    except requests.exceptions.RequestException as e:
-        logging.error(f"NOWPayments API error: {str(e)}")
+    except httpx.HTTPError as e:
+        logger.error("NOWPayments API error: %s", e)
         await update.message.reply_text("❌ Error creating payment. Please try again later.")
     except Exception as e:
-        logging.error(f"Error in create_payment: {str(e)}")
+        logger.error("Error in create_payment: %s", e)
         await update.message.reply_text("❌ An unexpected error occurred. Please try again later.")
 
 async def check_payment_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -370,14 +828,14 @@ async def check_payment_status(update: Update, context: ContextTypes.DEFAULT_TYP
         
         # Headers
         headers = {
-            "x-api-key": os.getenv('NOWPAYMENTS_API_KEY')
+            "x-api-key": NOWPAYMENTS_API_KEY
         }
         
         # Make the API request
-        response = requests.get(url, headers=headers)
+        response = await http_client.get(url, headers=headers)
         response.raise_for_status()
         
-        result = response.json()
+        result = orjson.loads(response.content)
         
         status = result.get('payment_status', 'unknown')
         amount = result.get('price_amount', 0)
@@ -390,42 +848,34 @@ async def check_payment_status(update: Update, context: ContextTypes.DEFAULT_TYP
             f"Payment ID: {payment_id}"
         )
         
-    except requests.exceptions.RequestException as e:
-        logging.error(f"NOWPayments API error: {str(e)}")
+    except httpx.HTTPError as e:
+        logger.error("NOWPayments API error: %s", e)
         await update.message.reply_text("❌ Error checking payment status. Please try again later.")
     except Exception as e:
-        logging.error(f"Error in check_payment_status: {str(e)}")
+        logger.error("Error in check_payment_status: %s", e)
         await update.message.reply_text("❌ An unexpected error occurred. Please try again later.")
 
+@require(chat_type='group')
 async def check_transaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /transaction command"""
-    if update.effective_chat.type == 'group':
-        if not context.args:
-            await update.message.reply_text("Please provide a transaction ID!")
-            return
-        
-        tx_id = context.args[0]
-        chat_id = update.effective_chat.id
+    if not context.args:
+        await update.message.reply_text("Please provide a transaction ID!")
+        return
+    
+    tx_id = context.args[0]
+    chat_id = update.effective_chat.id
+    
+    try:
+        # Initial check, against the coin of the escrow's addresses when they are set
+        tx_info, coin_type = await get_tx_info(tx_id, await get_tx_coin(chat_id))
         
-        try:
-            # Start monitoring the transaction
-            await start_monitoring(chat_id, tx_id, context)
+        if tx_info:
+            status = "Confirmed" if tx_info.get('confirmations', 0) > 0 else "Pending"
+            amount = tx_info.get('total', 0) / 100000000
+            from_address = tx_info.get('inputs', [{}])[0].get('addresses', ['Unknown'])[0]
+            to_address = tx_info.get('outputs', [{}])[0].get('addresses', ['Unknown'])[0]
             
-            # Initial check
-            try:
-                tx_info = get_transaction_details(tx_id, coin_symbol='btc')
-                coin_type = 'BTC'
-            except:
-                tx_info = get_transaction_details(tx_id, coin_symbol='ltc')
-                coin_type = 'LTC'
-            
-            if tx_info:
-                status = "Confirmed" if tx_info.get('confirmations', 0) > 0 else "Pending"
-                amount = tx_info.get('total', 0) / 100000000
-                from_address = tx_info.get('inputs', [{}])[0].get('addresses', ['Unknown'])[0]
-                to_address = tx_info.get('outputs', [{}])[0].get('addresses', ['Unknown'])[0]
-                
-                message = f"""
+            message = f"""
 Transaction Status: {status}
 Amount: {amount} {coin_type}
 From: {from_address}
@@ -433,120 +883,95 @@ To: {to_address}
 Confirmations: {tx_info.get('confirmations', 0)}
 
 I will now monitor this transaction and send updates when the status changes.
-                """
-                
-                await update.message.reply_text(message)
+            """
+            
+            await update.message.reply_text(message)
+
+            # Hand the tx to the poll_all_tx job, seeded with the status just reported
+            if status == "Confirmed":
+                await confirm_payment(chat_id, tx_id, context)
             else:
-                await update.message.reply_text("Transaction not found!")
-                
-        except Exception as e:
-            logger.error(f"Error checking transaction: {e}")
-            await update.message.reply_text("Error checking transaction status. Please try again later.")
-    else:
-        await update.message.reply_text("This command only works in group chats!")
+                await redis_client.hsetnx(monitor_key(chat_id), tx_id, status)
+        else:
+            await update.message.reply_text("Transaction not found!")
+            
+    except Exception as e:
+        logger.error("Error checking transaction: %s", e)
+        await update.message.reply_text("Error checking transaction status. Please try again later.")
 
+@require(chat_type='group', not_blocked=True, check_perms=True)
 async def set_buyer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /buyer command"""
-    if is_blocked(update.effective_user.id):
-        await update.message.reply_text("You are blocked from using this bot.")
+    if not context.args:
+        await update.message.reply_text("Please provide a cryptocurrency address!")
         return
-
-    if update.effective_chat.type == 'group':
-        if not await check_bot_permissions(update, context):
-            await update.message.reply_text("Bot needs admin privileges to function!")
-            return
-
-        if not context.args:
-            await update.message.reply_text("Please provide a cryptocurrency address!")
+    
+    try:
+        address = context.args[0]
+        coin_type = detect_crypto_type(address)
+        
+        # Verify address is valid
+        if not await is_valid_address(address, coin_type):
+            await update.message.reply_text("Invalid cryptocurrency address!")
             return
         
-        try:
-            address = context.args[0]
-            coin_type = detect_crypto_type(address)
-            
-            # Verify address is valid
-            address_info = get_address_details(address, coin_symbol=coin_type)
-            if not address_info:
-                await update.message.reply_text("Invalid cryptocurrency address!")
-                return
-            
-            chat_id = update.effective_chat.id
-            if chat_id not in active_transactions:
-                active_transactions[chat_id] = {}
-            
-            active_transactions[chat_id]['buyer'] = {
-                'address': address,
-                'coin_type': coin_type,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            await update.message.reply_text(f"Buyer role set with {coin_type.upper()} address: {address}")
-        except ValueError as e:
-            await update.message.reply_text(str(e))
-        except Exception as e:
-            logger.error(f"Error setting buyer: {e}")
-            await update.message.reply_text("Error setting buyer address. Please try again later.")
-    else:
-        await update.message.reply_text("This command only works in group chats!")
+        await set_tx_party(update.effective_chat.id, 'buyer', {
+            'user_id': update.effective_user.id,
+            'address': address,
+            'coin_type': coin_type,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        await update.message.reply_text(f"Buyer role set with {coin_type.upper()} address: {address}")
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+    except Exception as e:
+        logger.error("Error setting buyer: %s", e)
+        await update.message.reply_text("Error setting buyer address. Please try again later.")
 
+@require(chat_type='group', not_blocked=True, check_perms=True)
 async def set_seller(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /seller command"""
-    if is_blocked(update.effective_user.id):
-        await update.message.reply_text("You are blocked from using this bot.")
+    if not context.args:
+        await update.message.reply_text("Please provide a cryptocurrency address!")
         return
-
-    if update.effective_chat.type == 'group':
-        if not await check_bot_permissions(update, context):
-            await update.message.reply_text("Bot needs admin privileges to function!")
-            return
-
-        if not context.args:
-            await update.message.reply_text("Please provide a cryptocurrency address!")
+    
+    try:
+        address = context.args[0]
+        coin_type = detect_crypto_type(address)
+        
+        # Verify address is valid
+        if not await is_valid_address(address, coin_type):
+            await update.message.reply_text("Invalid cryptocurrency address!")
             return
         
-        try:
-            address = context.args[0]
-            coin_type = detect_crypto_type(address)
-            
-            # Verify address is valid
-            address_info = get_address_details(address, coin_symbol=coin_type)
-            if not address_info:
-                await update.message.reply_text("Invalid cryptocurrency address!")
-                return
-            
-            chat_id = update.effective_chat.id
-            if chat_id not in active_transactions:
-                active_transactions[chat_id] = {}
-            
-            active_transactions[chat_id]['seller'] = {
-                'address': address,
-                'coin_type': coin_type,
-                'timestamp': datetime.now().isoformat()
-            }
-            
-            await update.message.reply_text(f"Seller role set with {coin_type.upper()} address: {address}")
-        except ValueError as e:
-            await update.message.reply_text(str(e))
-        except Exception as e:
-            logger.error(f"Error setting seller: {e}")
-            await update.message.reply_text("Error setting seller address. Please try again later.")
-    else:
-        await update.message.reply_text("This command only works in group chats!")
+        await set_tx_party(update.effective_chat.id, 'seller', {
+            'user_id': update.effective_user.id,
+            'address': address,
+            'coin_type': coin_type,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        await update.message.reply_text(f"Seller role set with {coin_type.upper()} address: {address}")
+    except ValueError as e:
+        await update.message.reply_text(str(e))
+    except Exception as e:
+        logger.error("Error setting seller: %s", e)
+        await update.message.reply_text("Error setting seller address. Please try again later.")
 
+@require(chat_type='group')
 async def release(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /release command"""
-    if update.effective_chat.type != 'group':
-        await update.message.reply_text("This command only works in group chats!")
-        return
-
     chat_id = update.effective_chat.id
     user_id = update.effective_user.id
 
-    if chat_id not in active_transactions:
+    # Fetch the transaction and, if it is releasable by this user, delete it in the same call
+    claimed, fields = await claim_release_tx(keys=[tx_key(chat_id)], args=[user_id])
+    raw = dict(zip(fields[::2], fields[1::2]))
+    transaction = decode_tx(raw)
+    if not transaction:
         await update.message.reply_text("No active transaction found!")
         return
-
-    transaction = active_transactions[chat_id]
     
     # Check if user is either buyer or seller
     if 'buyer' not in transaction or 'seller' not in transaction:
@@ -561,6 +986,11 @@ async def release(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Payment must be confirmed before release!")
         return
 
+    # Another /release claimed it first
+    if not claimed:
+        await update.message.reply_text("No active transaction found!")
+        return
+
     try:
         # Calculate amounts with escrow fee
         total_amount = float(transaction['amount'])
@@ -576,7 +1006,8 @@ async def release(update: Update, context: ContextTypes.DEFAULT_TYPE):
             releaser = "Seller"
 
         # Create release payment
-        release_payment = nowpayments.create_payment(
+        release_payment = await asyncio.to_thread(
+            nowpayments.create_payment,
             price_amount=release_amount,
             price_currency='usd',
             order_id=f"release_{chat_id}_{datetime.now().timestamp()}",
@@ -584,29 +1015,27 @@ async def release(update: Update, context: ContextTypes.DEFAULT_TYPE):
             pay_address=release_address
         )
 
-        message = f"""
+    except Exception as e:
+        logger.error("Error releasing funds: %s", e)
+        # No payout was created, so put the transaction back and let the release be retried
+        await redis_client.hset(tx_key(chat_id), mapping=raw)
+        await update.message.reply_text("Error releasing funds. Please try again later.")
+        return
+
+    # The payout exists from here on; a failed reply must not restore the transaction
+    message = f"""
 Release Initiated by {releaser}:
 Amount: {release_amount} USD
 Address: {release_address}
-Payment ID: {release_payment['payment_id']}
+Payment ID: {release_payment.get('payment_id')}
 
 The funds will be released to the specified address. The escrow fee ({ESCROW_FEE_PERCENTAGE}%) has been deducted.
-        """
-        await update.message.reply_text(message)
-
-        # Clear the transaction
-        del active_transactions[chat_id]
-
-    except Exception as e:
-        logger.error(f"Error releasing funds: {e}")
-        await update.message.reply_text("Error releasing funds. Please try again later.")
+    """
+    await update.message.reply_text(message)
 
+@require(chat_type='group')
 async def admin_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /admin command"""
-    if update.effective_chat.type != 'group':
-        await update.message.reply_text("This command only works in group chats!")
-        return
-
     chat_id = update.effective_chat.id
     chat_link = await update.effective_chat.get_invite_link()
     
@@ -627,7 +1056,7 @@ Requested by: {update.effective_user.mention_html()}
         )
         await update.message.reply_text("✅ Admin has been notified and will join shortly!")
     except Exception as e:
-        logger.error(f"Error sending admin notification: {e}")
+        logger.error("Error sending admin notification: %s", e)
         await update.message.reply_text("❌ Error notifying admin. Please try again later.")
 
 async def block_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -642,8 +1071,7 @@ async def block_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         user_id = int(context.args[0])
-        blocked_users.add(user_id)
-        save_blocked_users()
+        await redis_client.sadd(BLOCKED_USERS_KEY, user_id)
         await update.message.reply_text(f"User {user_id} has been blocked from using the bot.")
     except ValueError:
         await update.message.reply_text("Invalid user ID!")
@@ -660,8 +1088,7 @@ async def unblock_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         user_id = int(context.args[0])
-        blocked_users.discard(user_id)
-        save_blocked_users()
+        await redis_client.srem(BLOCKED_USERS_KEY, user_id)
         await update.message.reply_text(f"User {user_id} has been unblocked.")
     except ValueError:
         await update.message.reply_text("Invalid user ID!")
@@ -679,40 +1106,40 @@ async def refund(update: Update, context: ContextTypes.DEFAULT_TYPE):
     tx_id = context.args[0]
     chat_id = update.effective_chat.id
 
-    if chat_id not in active_transactions:
+    transaction = await get_tx(chat_id)
+    if not transaction:
         await update.message.reply_text("No active transaction found!")
         return
 
-    transaction = active_transactions[chat_id]
     if 'payment_id' not in transaction:
         await update.message.reply_text("No payment found for this transaction!")
         return
 
     try:
         # Create refund through NOWPayments
-        refund = nowpayments.create_refund(
+        refund = await asyncio.to_thread(
+            nowpayments.create_refund,
             payment_id=transaction['payment_id'],
             reason="Admin initiated refund"
         )
 
-        message = f"""
+    except Exception as e:
+        logger.error("Error processing refund: %s", e)
+        await update.message.reply_text("Error processing refund. Please try again later.")
+        return
+
+    # The refund exists from here on; cancel the transaction before anything else can fail
+    await redis_client.delete(tx_key(chat_id), monitor_key(chat_id))
+
+    message = f"""
 🔔 Admin Refund Initiated
 Transaction ID: {tx_id}
-Amount: {transaction['amount']} USD
-Refund ID: {refund['refund_id']}
-        """
-        
-        await context.bot.send_message(
-            chat_id=ADMIN_GROUP_ID,
-            text=message
-        )
-        
-        await update.message.reply_text("Refund has been initiated. The transaction will be cancelled.")
-        del active_transactions[chat_id]
+Amount: {transaction.get('amount', 'N/A')} USD
+Refund ID: {refund.get('refund_id')}
+    """
+    notify_admins(message)
 
-    except Exception as e:
-        logger.error(f"Error processing refund: {e}")
-        await update.message.reply_text("Error processing refund. Please try again later.")
+    await update.message.reply_text("Refund has been initiated. The transaction will be cancelled.")
 
 async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle the /stats command (admin only)"""
@@ -720,8 +1147,8 @@ async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("This command is only available to admins!")
         return
 
-    total_transactions = len(active_transactions)
-    blocked_count = len(blocked_users)
+    total_transactions = await count_active_transactions()
+    blocked_count = await redis_client.scard(BLOCKED_USERS_KEY)
     
     stats_message = f"""
 📊 Bot Statistics
@@ -743,6 +1170,11 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif query.data == 'vouches':
         await vouches(update, context)
 
+async def close_clients(application: Application):
+    """Close shared HTTP and Redis connections on shutdown"""
+    await http_client.aclose()
+    await redis_client.close()
+
 def main():
     """Start the bot"""
     try:
@@ -752,37 +1184,72 @@ def main():
             logger.error("No bot token found! Please set BOT_TOKEN in .env file")
             return
 
-        # Create updater
-        updater = Updater(token, use_context=True)
-        dispatcher = updater.dispatcher
-
-        # Add handlers
-        dispatcher.add_handler(CommandHandler("start", start))
-        dispatcher.add_handler(CommandHandler("help", help_command))
-        dispatcher.add_handler(CommandHandler("links", links))
-        dispatcher.add_handler(CommandHandler("vouches", vouches))
-        dispatcher.add_handler(CommandHandler("buyer", set_buyer))
-        dispatcher.add_handler(CommandHandler("seller", set_seller))
-        dispatcher.add_handler(CommandHandler("transaction", check_transaction))
-        dispatcher.add_handler(CommandHandler("release", release))
-        dispatcher.add_handler(CommandHandler("admin", admin_command))
-        dispatcher.add_handler(CommandHandler("block", block_user))
-        dispatcher.add_handler(CommandHandler("unblock", unblock_user))
-        dispatcher.add_handler(CommandHandler("refund", refund))
-        dispatcher.add_handler(CommandHandler("stats", stats))
-        dispatcher.add_handler(CallbackQueryHandler(handle_callback))
-
-        # Start cleanup job
-        job_queue = updater.job_queue
-        job_queue.run_repeating(cleanup_old_transactions, interval=CLEANUP_INTERVAL)
+        # Create application, throttled to Telegram's global and per-group limits
+        rate_limiter = AIORateLimiter(
+            overall_max_rate=30,
+            overall_time_period=1,
+            group_max_rate=20,
+            group_time_period=60
+        )
+        application = (
+            Application.builder()
+            .token(token)
+            # Bot API calls are multiplexed over HTTP/2; getUpdates long-polls on its own connection
+            .request(HTTPXRequest(connection_pool_size=32, http_version='2'))
+            .get_updates_request(HTTPXRequest(connection_pool_size=1, http_version='2'))
+            .rate_limiter(rate_limiter)
+            .post_stop(flush_admin_outbox)
+            .post_shutdown(close_clients)
+            .concurrent_updates(True)
+            .build()
+        )
 
-        # Start the bot
-        updater.start_polling()
-        updater.idle()
+        # Add handlers; the ones doing network round-trips don't hold up the update queue
+        application.add_handler(CommandHandler("start", start))
+        application.add_handler(CommandHandler("help", help_command))
+        application.add_handler(CommandHandler("links", links))
+        application.add_handler(CommandHandler("vouches", vouches))
+        application.add_handler(CommandHandler("buyer", set_buyer, block=False))
+        application.add_handler(CommandHandler("seller", set_seller, block=False))
+        application.add_handler(CommandHandler("transaction", check_transaction, block=False))
+        application.add_handler(CommandHandler("release", release, block=False))
+        application.add_handler(CommandHandler("admin", admin_command))
+        application.add_handler(CommandHandler("block", block_user))
+        application.add_handler(CommandHandler("unblock", unblock_user))
+        application.add_handler(CommandHandler("refund", refund, block=False))
+        application.add_handler(CommandHandler("stats", stats))
+        application.add_handler(CallbackQueryHandler(handle_callback))
+        application.add_handler(ChatMemberHandler(handle_bot_member_update, ChatMemberHandler.MY_CHAT_MEMBER))
+
+        # Start cleanup, transaction monitoring and admin notification jobs
+        job_queue = application.job_queue
+        job_queue.run_repeating(cleanup_old_transactions, interval=CLEANUP_INTERVAL)
+        job_queue.run_repeating(poll_all_tx, interval=MONITORING_INTERVAL)
+        job_queue.run_repeating(flush_admin_notifications, interval=ADMIN_NOTIFY_INTERVAL)
+
+        # Start the bot: webhook when a public URL is configured, long polling otherwise
+        webhook_url = os.getenv('WEBHOOK_URL')
+        if webhook_url:
+            application.run_webhook(
+                listen='0.0.0.0',
+                port=int(os.getenv('PORT', 8443)),
+                url_path=token,
+                webhook_url=f"{webhook_url.rstrip('/')}/{token}",
+                secret_token=os.getenv('WEBHOOK_SECRET') or None,
+                max_connections=40,
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=DROP_PENDING_UPDATES
+            )
+        else:
+            # Long-poll getUpdates for up to 30s so an idle bot isn't re-requesting constantly
+            application.run_polling(
+                timeout=30,
+                allowed_updates=ALLOWED_UPDATES,
+                drop_pending_updates=DROP_PENDING_UPDATES
+            )
 
-    except Exception as e:
-        logger.error(f"Fatal error in main: {e}")
-        logger.error(traceback.format_exc())
+    except Exception:
+        logger.exception("Fatal error in main")
         raise
 
 if __name__ == '__main__':
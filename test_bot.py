@@ -1,45 +1,59 @@
 import os
 import logging
 from telegram import Bot
-from dotenv import load_dotenv
+from telegram.request import HTTPXRequest
 
-# Load environment variables
-load_dotenv()
+# Use uvloop's faster event loop where it is available (not on Windows)
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+# Load environment variables from .env unless the platform already provides them
+if not os.getenv('BOT_TOKEN'):
+    from dotenv import load_dotenv
+    load_dotenv()
+BOT_TOKEN = os.getenv('BOT_TOKEN')
+ADMIN_GROUP_ID = os.getenv('ADMIN_GROUP_ID')  # Numeric id or @channelusername
 
 # Configure logging
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     level=logging.INFO
 )
+# httpx logs every request URL at INFO, and Bot API URLs embed the bot token
+logging.getLogger('httpx').setLevel(logging.WARNING)
+# Records never report their source, thread or process, so skip collecting them
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
+logging._srcfile = None
 logger = logging.getLogger(__name__)
 
 async def test_bot():
     """Test if the bot is working"""
     try:
-        # Get bot token
-        token = os.getenv('BOT_TOKEN')
-        if not token:
+        if not BOT_TOKEN:
             logger.error("No bot token found!")
             return
 
-        # Initialize bot
-        bot = Bot(token=token)
-        
-        # Get bot info
-        bot_info = await bot.get_me()
-        logger.info(f"Bot is working! Bot username: @{bot_info.username}")
-        
-        # Test admin group notification
-        admin_group_id = os.getenv('ADMIN_GROUP_ID')
-        if admin_group_id:
-            await bot.send_message(
-                chat_id=admin_group_id,
-                text="🤖 Bot is now running on Railway!"
-            )
-            logger.info("Admin notification sent successfully!")
-        
-    except Exception as e:
-        logger.error(f"Error testing bot: {e}")
+        # Initialize bot on a pooled keep-alive HTTP/2 connection, reused by every call below
+        request = HTTPXRequest(connection_pool_size=16, connect_timeout=5.0, read_timeout=30.0, http_version='2')
+        async with Bot(token=BOT_TOKEN, request=request) as bot:
+            # Bot info was fetched by get_me() while the bot initialized; reuse it
+            logger.info("Bot is working! Bot username: @%s", bot.username)
+
+            # Test admin group notification
+            if ADMIN_GROUP_ID:
+                await bot.send_message(
+                    chat_id=ADMIN_GROUP_ID,
+                    text="🤖 Bot is now running on Railway!"
+                )
+                logger.info("Admin notification sent successfully!")
+
+    except Exception:
+        logger.exception("Error testing bot")
 
 if __name__ == '__main__':
     import asyncio